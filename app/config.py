@@ -6,4 +6,20 @@ load_dotenv()  #  .env
 GEONETWORK_USER = os.getenv("GEONETWORK_USER")
 GEONETWORK_PASSWORD = os.getenv("GEONETWORK_PASSWORD")
 GEONETWORK_SERVER = os.getenv("GEONETWORK_SERVER")
-GDAL_CACHEMAX = os.getenv("user","password")  # valor por defecto si no se define
+
+# Runtime de GDAL (ver app/services/gdal_runtime.py). Si no se definen,
+# se derivan de la CPU/RAM del host al arrancar.
+GDAL_CACHEMAX = os.getenv("GDAL_CACHEMAX")                    # MB, "512MB" o "10%"
+GDAL_NUM_THREADS = os.getenv("GDAL_NUM_THREADS")              # número o ALL_CPUS
+GDAL_WARP_MULTITHREAD = os.getenv("GDAL_WARP_MULTITHREAD")    # TRUE/FALSE
+GDAL_WARP_MEMORY_LIMIT = os.getenv("GDAL_WARP_MEMORY_LIMIT")  # MB
+GDAL_DISABLE_READDIR_ON_OPEN = os.getenv("GDAL_DISABLE_READDIR_ON_OPEN")
+VSI_CACHE = os.getenv("VSI_CACHE")
+VSI_CACHE_SIZE = os.getenv("VSI_CACHE_SIZE")                  # bytes
+
+# Error máximo admitido al guardar salidas como enteros con scale/offset
+OUTPUT_SCALE_TOLERANCE = float(os.getenv("OUTPUT_SCALE_TOLERANCE", "0.01"))
+
+# Logging estructurado: nivel (DEBUG, INFO, WARNING...) y formato ("json" o "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
@@ -1,8 +1,17 @@
 #app/main.py
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.routes import raster, pipeline
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import GEONETWORK_USER, GEONETWORK_PASSWORD
+from app.config import GEONETWORK_USER, GEONETWORK_PASSWORD, LOG_LEVEL, LOG_FORMAT
+from app.utils.logging_utils import configure_logging
+from app.utils.metrics import render_prometheus
+from app.services.gdal_runtime import apply_gdal_runtime
+import logging
+
+configure_logging(LOG_LEVEL, LOG_FORMAT)
+log = logging.getLogger(__name__)
+apply_gdal_runtime()  # una vez por proceso; reporta los valores efectivos en el log
 
 # app/main.py
 app = FastAPI(title="MapStore GDAL Backend", debug=True)  # ← temporal
@@ -24,6 +33,12 @@ app.include_router(pipeline.router, tags=["Pipeline"])
 
 @app.get("/")
 def root():
-    print(f"Conectando con usuario: {GEONETWORK_USER}")
+    log.debug("Conectando con usuario: %s", GEONETWORK_USER)
     return {"message": "GDAL API funcionando 🚀"}
 
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas del proceso en formato de texto de Prometheus."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
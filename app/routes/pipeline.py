@@ -8,17 +8,38 @@ from fastapi.responses import FileResponse, JSONResponse
 from typing import List, Optional
 from pathlib import Path
 from osgeo import gdal
+import logging
+import time
 
 from app.utils.pipeline_utils import (
     new_job_id, ensure_job_dirs, init_manifest, read_manifest, write_manifest,
     save_uploads_chunked, sanitize_filename, job_root, cleanup_job
 )
+from app.utils.metrics import BYTES, JOBS, JOB_DURATION, inc, stage_timer
 
 router = APIRouter(prefix="/pipeline", tags=["Pipeline"])
 
 from app.services.process_rasters import process_rasters
+from app.services.aoi import AOIError, parse_aoi, aoi_to_dict, aoi_from_dict
 #
 gdal.UseExceptions()  # errores claros
+log = logging.getLogger(__name__)
+
+
+def _finish_job(stage: str, job_id: Optional[str], t0: float, status: str, metrics: dict) -> None:
+    """Cierra las métricas de una llamada al pipeline (duración total y resultado)."""
+    elapsed = time.perf_counter() - t0
+    JOB_DURATION.observe(elapsed, stage=stage)
+    JOBS.inc(stage=stage, status=status)
+    metrics["duration_s"] = round(elapsed, 6)
+    log.info("%s %s", stage, status, extra={"job_id": job_id, "stage": stage, "metrics": metrics})
+
+
+def _reject(stage: str, job_id: Optional[str], t0: float, metrics: dict,
+            status_code: int, detail: str) -> HTTPException:
+    """Registra una llamada rechazada (error del cliente) y retorna la HTTPException a lanzar."""
+    _finish_job(stage, job_id, t0, "rejected", metrics)
+    return HTTPException(status_code, detail=detail)
 
 @router.post("/start")
 async def pipeline_start(
@@ -26,18 +47,33 @@ async def pipeline_start(
     multipliers: str = Form(...),
     output_filename: str = Form(...),
     job_id: Optional[str] = Form(None),
-    user: Optional[str] = Form(None)
+    user: Optional[str] = Form(None),
+    aoi_bbox: Optional[str] = Form(None),
+    aoi_crs: Optional[str] = Form(None),
+    aoi_geojson: Optional[str] = Form(None),
 ):
     """
     Etapa 1: recibe N rasters y multipliers. Genera UNA salida intermedia (por ejemplo, por categoría).
     - Si no viene job_id => crea uno y arranca el pipeline.
     - Si viene job_id => agrega una salida más a stage1/outputs de ese job.
+    - AOI opcional: `aoi_bbox` ("minx,miny,maxx,maxy") o `aoi_geojson`, en `aoi_crs`
+      (EPSG:4326 por defecto). La salida se limita a la extensión del AOI.
+      El AOI es único por job: se fija en la primera capa; las siguientes
+      lo heredan si no lo indican y se rechazan si indican otro.
     Devuelve: job_id y lista acumulada de outputs de stage1.
     """
+    t0 = time.perf_counter()
+    job_metrics: dict = {}
     try:
         multipliers_list = [float(x) for x in multipliers.split(",")]
     except Exception:
-        raise HTTPException(400, detail="Multiplicadores inválidos. Usa flotantes separados por coma.")
+        raise _reject("stage1", job_id, t0, job_metrics, 400,
+                      "Multiplicadores inválidos. Usa flotantes separados por coma.")
+
+    try:
+        aoi = parse_aoi(aoi_bbox, aoi_crs, aoi_geojson)
+    except AOIError as e:
+        raise _reject("stage1", job_id, t0, job_metrics, 400, str(e))
 
     job = job_id or new_job_id()
     dirs = ensure_job_dirs(job)
@@ -47,8 +83,19 @@ async def pipeline_start(
     if not m:
         m = init_manifest(job, user=user)
 
-    # guarda entradas en stage1/inputs
-    input_paths = save_uploads_chunked(dirs["stage1_inputs"], files)
+    # AOI único por job: todas las capas de stage1 deben compartir la misma ventana
+    stored_aoi = m.get("aoi")
+    if aoi is None:
+        aoi = aoi_from_dict(stored_aoi)
+    elif (stored_aoi or m.get("stage1", {}).get("outputs")) and aoi_to_dict(aoi) != stored_aoi:
+        raise _reject("stage1", job, t0, job_metrics, 400,
+                      "El job ya tiene un AOI distinto; todas las capas de Stage1 deben usar el mismo.")
+
+    # guarda entradas en stage1/inputs (el cuerpo ya fue recibido por Starlette;
+    # esto mide sólo la copia desde sus temporales)
+    with stage_timer("save_inputs", job_metrics):
+        input_paths = save_uploads_chunked(dirs["stage1_inputs"], files)
+    inc(BYTES, sum(Path(p).stat().st_size for p in input_paths), job=job_metrics, direction="upload")
 
     out_name = sanitize_filename(output_filename)
     out_path = str((dirs["stage1_outputs"] / out_name).resolve())
@@ -59,17 +106,31 @@ async def pipeline_start(
             multipliers=multipliers_list,
             output_path=out_path,
             aligned_dir=str(dirs["stage1_aligned"]),  # <- usa el aligned del job
+            aoi=aoi,
+            metrics=job_metrics,
         )
 
 
+    except AOIError as e:
+        raise _reject("stage1", job, t0, job_metrics, 400, f"Error en Stage1: {e}")
     except Exception as e:
+        _finish_job("stage1", job, t0, "error", job_metrics)
+        log.exception("Error en Stage1", extra={"job_id": job})
         raise HTTPException(500, detail=f"Error en Stage1: {e}")
+    if not result_path:
+        # process_rasters registró la causa en el log; no hay salida que guardar
+        _finish_job("stage1", job, t0, "error", job_metrics)
+        raise HTTPException(500, detail="Error en Stage1: no se generó la salida.")
+    _finish_job("stage1", job, t0, "ok", job_metrics)
 
     # actualiza manifest
     m["status"] = "stage1_partial"
+    if aoi is not None:
+        m["aoi"] = aoi_to_dict(aoi)
     m.setdefault("stage1", {}).setdefault("outputs", [])
     if result_path not in m["stage1"]["outputs"]:
         m["stage1"]["outputs"].append(result_path)
+    m.setdefault("metrics", {}).setdefault("stage1", []).append({"output": result_path, **job_metrics})
     write_manifest(job, m)
 
     return JSONResponse({"job_id": job, "added": result_path, "stage1_outputs": m["stage1"]["outputs"]})
@@ -79,25 +140,39 @@ async def pipeline_start(
 async def pipeline_continue(
     job_id: str = Form(...),
     multipliers: Optional[str] = Form(None),
-    output_filename: Optional[str] = Form("final_result.tif")
+    output_filename: Optional[str] = Form("final_result.tif"),
+    aoi_bbox: Optional[str] = Form(None),
+    aoi_crs: Optional[str] = Form(None),
+    aoi_geojson: Optional[str] = Form(None),
 ):
     """
     Etapa 2: usa las 7 salidas de Stage1 y produce el raster final.
+    Acepta el mismo AOI opcional que /start; si no se indica, usa el del job.
     """
+    t0 = time.perf_counter()
+    job_metrics: dict = {}
     m = read_manifest(job_id)
     if not m:
-        raise HTTPException(404, detail="job_id no encontrado")
+        raise _reject("stage2", job_id, t0, job_metrics, 404, "job_id no encontrado")
 
     outputs = m.get("stage1", {}).get("outputs") or []
     if len(outputs) < 7:
-        raise HTTPException(400, detail=f"Stage1 incompleto. Se esperan 7 capas, hay {len(outputs)}.")
+        raise _reject("stage2", job_id, t0, job_metrics, 400,
+                      f"Stage1 incompleto. Se esperan 7 capas, hay {len(outputs)}.")
 
     mults = None
     if multipliers:
         try:
             mults = [float(x) for x in multipliers.split(",")]
         except Exception:
-            raise HTTPException(400, detail="Multiplicadores Stage2 inválidos")
+            raise _reject("stage2", job_id, t0, job_metrics, 400, "Multiplicadores Stage2 inválidos")
+
+    try:
+        aoi = parse_aoi(aoi_bbox, aoi_crs, aoi_geojson)
+    except AOIError as e:
+        raise _reject("stage2", job_id, t0, job_metrics, 400, str(e))
+    if aoi is None:
+        aoi = aoi_from_dict(m.get("aoi"))
 
     dirs = ensure_job_dirs(job_id)
     out_name = sanitize_filename(output_filename or "final_result.tif")
@@ -109,14 +184,27 @@ async def pipeline_continue(
             multipliers=mults or [1,1,1,1,1,1,1],
             output_path=final_path,
             aligned_dir=str(dirs["stage2_aligned"]),   
+            aoi=aoi,
+            metrics=job_metrics,
         )
 
+    except AOIError as e:
+        raise _reject("stage2", job_id, t0, job_metrics, 400, f"Error en Stage2: {e}")
     except Exception as e:
+        _finish_job("stage2", job_id, t0, "error", job_metrics)
+        log.exception("Error en Stage2", extra={"job_id": job_id})
         raise HTTPException(500, detail=f"Error en Stage2: {e}")
+    if not result:
+        _finish_job("stage2", job_id, t0, "error", job_metrics)
+        raise HTTPException(500, detail="Error en Stage2: no se generó la salida.")
+    _finish_job("stage2", job_id, t0, "ok", job_metrics)
 
     m["status"] = "done"
     m["stage1"]["done"] = True
     m["stage2"] = {"done": True, "output": result}
+    if aoi is not None:
+        m["stage2"]["aoi"] = aoi_to_dict(aoi)
+    m.setdefault("metrics", {})["stage2"] = job_metrics
     write_manifest(job_id, m)
 
     return {"job_id": job_id, "final": result}
@@ -0,0 +1,247 @@
+# app/services/aoi.py
+from __future__ import annotations
+from osgeo import gdal, ogr, osr
+from typing import Optional, Tuple
+import json
+import math
+import numpy as np
+
+gdal.UseExceptions()
+ogr.UseExceptions()
+osr.UseExceptions()
+
+AOI_CRS_DEFAULT = "EPSG:4326"
+
+Window = Tuple[int, int, int, int]  # (xoff, yoff, width, height) en píxeles
+
+
+class AOIError(ValueError):
+    """AOI inválido o incompatible con los rásters (error del cliente)."""
+
+
+def _srs_from_user(crs: Optional[str]) -> osr.SpatialReference:
+    srs = osr.SpatialReference()
+    try:
+        srs.SetFromUserInput(crs or AOI_CRS_DEFAULT)
+    except Exception:
+        raise AOIError(f"CRS del AOI inválido: {crs}")
+    # lon/lat (x, y) como en GeoJSON, sin importar el orden de ejes de la autoridad
+    srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    return srs
+
+
+def _geometry_from_geojson(text: str) -> ogr.Geometry:
+    try:
+        obj = json.loads(text)
+    except Exception:
+        raise AOIError("GeoJSON del AOI inválido.")
+
+    kind = obj.get("type") if isinstance(obj, dict) else None
+    if kind == "FeatureCollection":
+        geoms = [f.get("geometry") for f in obj.get("features") or []]
+    elif kind == "Feature":
+        geoms = [obj.get("geometry")]
+    else:
+        geoms = [obj]
+
+    union = None
+    for g in geoms:
+        if not g:
+            continue
+        try:
+            geom = ogr.CreateGeometryFromJson(json.dumps(g))
+        except Exception:
+            geom = None
+        if geom is None:
+            raise AOIError("Geometría GeoJSON del AOI inválida.")
+        if geom.GetGeometryType() not in (
+            ogr.wkbPolygon, ogr.wkbMultiPolygon, ogr.wkbPolygon25D, ogr.wkbMultiPolygon25D
+        ):
+            raise AOIError("El AOI GeoJSON debe ser Polygon o MultiPolygon.")
+        union = geom if union is None else union.Union(geom)
+
+    if union is None or union.IsEmpty():
+        raise AOIError("El AOI GeoJSON no contiene geometrías.")
+    return union
+
+
+def parse_aoi(
+    bbox: Optional[str] = None,
+    crs: Optional[str] = None,
+    geojson: Optional[str] = None,
+) -> Optional[ogr.Geometry]:
+    """
+    Construye el AOI a partir de un bbox "minx,miny,maxx,maxy" o de un GeoJSON
+    (Geometry, Feature o FeatureCollection de polígonos), ambos en `crs`
+    (por defecto EPSG:4326). Retorna None si no se pasa ninguno.
+    Lanza AOIError si el AOI es inválido.
+    """
+    if not bbox and not geojson:
+        return None
+    if bbox and geojson:
+        raise AOIError("Indica el AOI como bbox o como GeoJSON, no ambos.")
+
+    if bbox:
+        try:
+            minx, miny, maxx, maxy = [float(v) for v in bbox.split(",")]
+        except Exception:
+            raise AOIError("bbox del AOI inválido. Usa minx,miny,maxx,maxy.")
+        if not (minx < maxx and miny < maxy):
+            raise AOIError("bbox del AOI inválido: min debe ser menor que max.")
+        ring = ogr.Geometry(ogr.wkbLinearRing)
+        for x, y in ((minx, miny), (maxx, miny), (maxx, maxy), (minx, maxy), (minx, miny)):
+            ring.AddPoint_2D(x, y)
+        geom = ogr.Geometry(ogr.wkbPolygon)
+        geom.AddGeometry(ring)
+    else:
+        geom = _geometry_from_geojson(geojson)
+
+    srs = _srs_from_user(crs)
+    if bbox and srs.IsGeographic() and not (
+        -180.0 <= minx and maxx <= 180.0 and -90.0 <= miny and maxy <= 90.0
+    ):
+        raise AOIError("bbox del AOI fuera de rango: lon debe estar en [-180, 180] y lat en [-90, 90].")
+    geom.AssignSpatialReference(srs)
+    return geom
+
+
+def aoi_to_dict(geom: Optional[ogr.Geometry]) -> Optional[dict]:
+    """Representación serializable del AOI (para el manifest)."""
+    if geom is None:
+        return None
+    srs = geom.GetSpatialReference()
+    return {
+        "geometry": json.loads(geom.ExportToJson()),
+        "crs": srs.ExportToWkt() if srs else None,
+    }
+
+
+def aoi_from_dict(data: Optional[dict]) -> Optional[ogr.Geometry]:
+    """Reconstruye el AOI guardado en el manifest con aoi_to_dict."""
+    if not data:
+        return None
+    geom = ogr.CreateGeometryFromJson(json.dumps(data["geometry"]))
+    if data.get("crs"):
+        srs = osr.SpatialReference()
+        srs.ImportFromWkt(data["crs"])
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        geom.AssignSpatialReference(srs)
+    return geom
+
+
+def aoi_in_raster_crs(geom: ogr.Geometry, proj_wkt: str) -> ogr.Geometry:
+    """
+    Copia del AOI reproyectada al CRS del ráster. Lanza AOIError si el ráster
+    no tiene un CRS legible o el AOI no se puede transformar a él.
+    """
+    target = osr.SpatialReference()
+    try:
+        target.ImportFromWkt(proj_wkt)
+    except Exception:
+        raise AOIError("La capa base no tiene un CRS válido para aplicar el AOI.")
+    target.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+    out = geom.Clone()
+    source = out.GetSpatialReference()
+    if source is not None and not source.IsSame(target):
+        # densifica para que los bordes sigan la curvatura tras reproyectar
+        env = out.GetEnvelope()
+        out.Segmentize(max(env[1] - env[0], env[3] - env[2]) / 64.0)
+        try:
+            out.TransformTo(target)
+        except Exception:
+            raise AOIError("No se pudo reproyectar el AOI al CRS de la capa base.")
+    out.AssignSpatialReference(target)
+    return out
+
+
+def aoi_window(
+    geom: ogr.Geometry, proj_wkt: str, geotransform: tuple, width: int, height: int
+) -> Optional[Window]:
+    """
+    Ventana en píxeles (xoff, yoff, width, height) del ráster que cubre el AOI,
+    ajustada a la grilla y recortada a su extensión. None si no se intersectan.
+    Asume ráster norte-arriba (sin rotación).
+    """
+    local = aoi_in_raster_crs(geom, proj_wkt)
+    minx, maxx, miny, maxy = local.GetEnvelope()
+
+    x0, px, _, y0, _, py = geotransform
+    cols = sorted(((minx - x0) / px, (maxx - x0) / px))
+    rows = sorted(((miny - y0) / py, (maxy - y0) / py))
+
+    xoff = max(0, int(math.floor(cols[0])))
+    yoff = max(0, int(math.floor(rows[0])))
+    xend = min(width, int(math.ceil(cols[1])))
+    yend = min(height, int(math.ceil(rows[1])))
+
+    if xend <= xoff or yend <= yoff:
+        return None
+    return xoff, yoff, xend - xoff, yend - yoff
+
+
+def window_geotransform(geotransform: tuple, window: Window) -> tuple:
+    """GeoTransform de la ventana `window` dentro de la grilla `geotransform`."""
+    x0, px, rx, y0, ry, py = geotransform
+    xoff, yoff = window[0], window[1]
+    return (x0 + xoff * px + yoff * rx, px, rx, y0 + xoff * ry + yoff * py, ry, py)
+
+
+def _grid_bounds(geotransform: tuple, width: int, height: int) -> Tuple[float, float, float, float]:
+    """(minx, miny, maxx, maxy) de una grilla norte-arriba."""
+    x0, px, _, y0, _, py = geotransform
+    xs = sorted((x0, x0 + width * px))
+    ys = sorted((y0, y0 + height * py))
+    return xs[0], ys[0], xs[1], ys[1]
+
+
+def prepare_aoi_mask(
+    geom: ogr.Geometry, proj_wkt: str, geotransform: tuple, width: int, height: int
+) -> dict:
+    """
+    Capa OGR en memoria con el AOI en el CRS del ráster, para rasterizarlo
+    bloque a bloque con aoi_block_mask (la memoria no depende del tamaño de la
+    ventana). Lanza AOIError si el AOI no toca la grilla.
+    """
+    local = aoi_in_raster_crs(geom, proj_wkt)
+
+    minx, miny, maxx, maxy = _grid_bounds(geotransform, width, height)
+    ring = ogr.Geometry(ogr.wkbLinearRing)
+    for x, y in ((minx, miny), (maxx, miny), (maxx, maxy), (minx, maxy), (minx, miny)):
+        ring.AddPoint_2D(x, y)
+    extent = ogr.Geometry(ogr.wkbPolygon)
+    extent.AddGeometry(ring)
+    if not local.Intersects(extent):
+        raise AOIError("El AOI no cubre ningún píxel de la capa base.")
+
+    vec_ds = ogr.GetDriverByName("Memory").CreateDataSource("aoi")
+    layer = vec_ds.CreateLayer("aoi", srs=local.GetSpatialReference(), geom_type=ogr.wkbUnknown)
+    feature = ogr.Feature(layer.GetLayerDefn())
+    feature.SetGeometry(local)
+    layer.CreateFeature(feature)
+    feature = None
+
+    # se guarda también el datasource: la capa no es válida sin él
+    return {"ds": vec_ds, "layer": layer, "proj": proj_wkt, "geotransform": geotransform}
+
+
+def aoi_block_mask(mask: dict, x: int, y: int, width: int, height: int) -> np.ndarray:
+    """
+    Máscara booleana (True dentro del AOI) del bloque (x, y, width, height) de
+    la grilla de prepare_aoi_mask. Se rasteriza con ALL_TOUCHED en un MEM del
+    tamaño del bloque; los bloques cuyo rectángulo no toca el AOI se descartan
+    con el filtro espacial sin rasterizar.
+    """
+    block_transform = window_geotransform(mask["geotransform"], (x, y, width, height))
+    layer = mask["layer"]
+    layer.SetSpatialFilterRect(*_grid_bounds(block_transform, width, height))
+    try:
+        if layer.GetFeatureCount() == 0:
+            return np.zeros((height, width), dtype=bool)
+        block_ds = gdal.GetDriverByName("MEM").Create("", width, height, 1, gdal.GDT_Byte)
+        block_ds.SetGeoTransform(block_transform)
+        block_ds.SetProjection(mask["proj"])
+        gdal.RasterizeLayer(block_ds, [1], layer, burn_values=[1], options=["ALL_TOUCHED=TRUE"])
+        return block_ds.GetRasterBand(1).ReadAsArray().astype(bool)
+    finally:
+        layer.SetSpatialFilter(None)
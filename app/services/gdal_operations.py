@@ -4,9 +4,16 @@ from osgeo import gdal
 from pathlib import Path
 from typing import List, Optional 
 import os 
+import logging
+import math
 import numpy as np
 
+from app.services.aoi import AOIError, aoi_window, window_geotransform
+from app.services.gdal_runtime import warp_kwargs
+from app.utils.metrics import WARP_CALLS, inc
+
 gdal.UseExceptions()          # ← recomendado
+log = logging.getLogger(__name__)
 
 # (opcional) valor por defecto para compatibilidad
 ALIGNED_FOLDER_DEFAULT = "app/temp_aligned"
@@ -16,10 +23,20 @@ def _ensure_dir(p: str | Path) -> Path:
     p.mkdir(parents=True, exist_ok=True)
     return p
 
-def check_and_align_rasters(input_paths: List[str], aligned_dir: Optional[str] ) -> List[str]:
+def _same_geotransform(a: tuple, b: tuple) -> bool:
+    """Misma grilla (origen y tamaño de píxel), tolerando ruido de coma flotante."""
+    return all(math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-9) for x, y in zip(a, b))
+
+def check_and_align_rasters(
+    input_paths: List[str], aligned_dir: Optional[str], aoi=None,
+    metrics: Optional[dict] = None,
+) -> List[str]:
     """
     Verifica CRS y dimensiones. Si difieren, genera versiones alineadas
     en `aligned_dir` (si se pasa) o en ALIGNED_FOLDER_DEFAULT.
+    Si se pasa `aoi` (ogr.Geometry), todas las capas se recortan a la ventana
+    de la capa base que cubre el AOI. Lanza AOIError si no se intersectan.
+    `metrics` (dict del job, ver app.utils.metrics) acumula las llamadas a Warp.
     Retorna rutas (originales o alineadas).
     """
     if not input_paths:
@@ -29,7 +46,7 @@ def check_and_align_rasters(input_paths: List[str], aligned_dir: Optional[str] )
 
     ref_ds = gdal.Open(input_paths[0])
     if not ref_ds:
-        print(f"[X] Error al abrir la capa base: {input_paths[0]}")
+        log.error("Error al abrir la capa base: %s", input_paths[0])
         return []
 
     ref_proj = ref_ds.GetProjection()
@@ -37,14 +54,24 @@ def check_and_align_rasters(input_paths: List[str], aligned_dir: Optional[str] )
     ref_width = ref_ds.RasterXSize
     ref_height = ref_ds.RasterYSize
 
-    print(f"[**] Raster base: {input_paths[0]} ({ref_width}x{ref_height})")
+    log.info("Raster base: %s (%dx%d)", input_paths[0], ref_width, ref_height)
+
+    if aoi is not None:
+        window = aoi_window(aoi, ref_proj, ref_transform, ref_width, ref_height)
+        if window is None:
+            raise AOIError("El AOI no intersecta la capa base.")
+        ref_ds = None
+        return _clip_and_align_rasters(
+            input_paths, aligned_root, ref_proj, ref_transform, ref_width, ref_height, window,
+            metrics=metrics,
+        )
 
     aligned_paths: List[str] = []
 
     for src in input_paths:
         ds = gdal.Open(src)
         if not ds:
-            print(f"[X] Error al abrir {src}")
+            log.error("Error al abrir %s", src)
             continue
 
         band = ds.GetRasterBand(1)
@@ -52,6 +79,7 @@ def check_and_align_rasters(input_paths: List[str], aligned_dir: Optional[str] )
         nodata = band.GetNoDataValue()
 
         proj = ds.GetProjection()
+        transform = ds.GetGeoTransform()
         width, height = ds.RasterXSize, ds.RasterYSize
 
         # salida candidata (no pisa el original)
@@ -62,19 +90,22 @@ def check_and_align_rasters(input_paths: List[str], aligned_dir: Optional[str] )
 
         # 1) reproyección si difiere CRS
         if proj != ref_proj:
-            print(f"[!] CRS diferente en {src}. REPROYECTANDO.")
+            log.info("CRS diferente en %s. Reproyectando.", src)
             current_path = reproject_raster(
-                current_path, ref_proj, str(out_path), nodata_value=nodata
+                current_path, ref_proj, str(out_path), nodata_value=nodata, metrics=metrics
             )
             changed = True
 
-        # 2) ajuste de dimensiones si difieren
-        if (width != ref_width) or (height != ref_height):
-            print(f"[!] Dimensiones diferentes en {src}. AJUSTANDO DIMENSIONES")
+        # 2) ajuste a la grilla base si difieren dimensiones u origen/píxel
+        #    (misma talla con otro origen también queda desalineada)
+        if (changed or (width != ref_width) or (height != ref_height)
+                or not _same_geotransform(transform, ref_transform)):
+            log.info("Grilla diferente en %s. Ajustando a la grilla base.", src)
             # si aún no cambiamos, usar out_path; si ya lo usamos, crear otro nombre
             out_dim = out_path if not changed else aligned_root / f"{stem}_aligned_size.tif"
             current_path = adjust_dimensions_raster(
-                current_path, ref_transform, ref_width, ref_height, str(out_dim), nodata_value=nodata
+                current_path, ref_transform, ref_width, ref_height, str(out_dim), nodata_value=nodata,
+                metrics=metrics,
             )
             changed = True
 
@@ -82,19 +113,84 @@ def check_and_align_rasters(input_paths: List[str], aligned_dir: Optional[str] )
         final_path = current_path if changed else src
 
         if not Path(final_path).exists():
-            print(f"[X] ERROR: {final_path} no fue generado correctamente.")
+            log.error("%s no fue generado correctamente.", final_path)
             continue
 
         aligned_paths.append(str(final_path))
 
-    print("[OK] Finalizó la verificación y alineación de los rásters.")
+    log.info("Finalizó la verificación y alineación de %d rásters.", len(aligned_paths))
     return aligned_paths
 
 
-def reproject_raster(input_path: str, target_crs: str, temp_output: str, nodata_value) -> str:
+def _clip_and_align_rasters(
+    input_paths: List[str], aligned_root: Path, ref_proj: str, ref_transform: tuple,
+    ref_width: int, ref_height: int, window: tuple, metrics: Optional[dict] = None
+) -> List[str]:
+    """
+    Variante con AOI: sólo se lee/escribe la ventana `window` de la grilla base.
+    Capas con la misma grilla se recortan con un VRT (sin copiar píxeles);
+    el resto se reproyecta/ajusta en un único Warp limitado a la ventana.
+    """
+    xoff, yoff, win_width, win_height = window
+    win_transform = window_geotransform(ref_transform, window)
+    log.info("AOI: ventana %dx%d en (%d,%d)", win_width, win_height, xoff, yoff)
+
+    aligned_paths: List[str] = []
+
+    for src in input_paths:
+        ds = gdal.Open(src)
+        if not ds:
+            log.error("Error al abrir %s", src)
+            continue
+
+        nodata = ds.GetRasterBand(1).GetNoDataValue()
+        same_grid = (
+            ds.GetProjection() == ref_proj
+            and _same_geotransform(ds.GetGeoTransform(), ref_transform)
+            and ds.RasterXSize == ref_width
+            and ds.RasterYSize == ref_height
+        )
+        ds = None
+
+        stem = Path(src).stem
+        if same_grid:
+            final_path = clip_raster_window(src, window, str(aligned_root / f"{stem}_aoi.vrt"))
+        else:
+            log.info("Grilla diferente en %s. Alineando a la ventana del AOI.", src)
+            final_path = adjust_dimensions_raster(
+                src, win_transform, win_width, win_height,
+                str(aligned_root / f"{stem}_aligned.tif"), nodata_value=nodata,
+                target_crs=ref_proj, metrics=metrics,
+            )
+
+        if final_path == src or not Path(final_path).exists():
+            log.error("No se pudo recortar %s al AOI.", src)
+            continue
+
+        aligned_paths.append(str(final_path))
+
+    log.info("Finalizó el recorte y alineación de %d rásters al AOI.", len(aligned_paths))
+    return aligned_paths
+
+
+def clip_raster_window(input_path: str, window: tuple, temp_output: str) -> str:
+    """Recorta `window` (xoff, yoff, width, height) de `input_path` como VRT."""
+    _ensure_dir(Path(temp_output).parent)
+    clipped_ds = gdal.Translate(temp_output, input_path, format="VRT", srcWin=list(window))
+    log.debug("Recortando %s → %s %s", input_path, temp_output, tuple(window))
+    if clipped_ds:
+        clipped_ds = None
+        return temp_output
+    return input_path
+
+
+def reproject_raster(
+    input_path: str, target_crs: str, temp_output: str, nodata_value,
+    metrics: Optional[dict] = None
+) -> str:
     dataset = gdal.Open(input_path)
     if not dataset:
-        print(f"[X] Error al abrir el ráster al reproyectar, se retorna el original: {input_path}")
+        log.error("Error al abrir el ráster al reproyectar, se retorna el original: %s", input_path)
         return input_path
 
     _ensure_dir(Path(temp_output).parent)
@@ -103,9 +199,11 @@ def reproject_raster(input_path: str, target_crs: str, temp_output: str, nodata_
         dataset,
         dstSRS=target_crs,
         resampleAlg=gdal.GRA_NearestNeighbour,  # categorías
-        dstNodata=nodata_value
+        dstNodata=nodata_value,
+        **warp_kwargs(),
     )
-    print(f"[**] Reproyectando {input_path} → {temp_output}")
+    inc(WARP_CALLS, job=metrics, kind="reproject")
+    log.debug("Reproyectando %s → %s", input_path, temp_output)
     if reprojected_ds:
         reprojected_ds = None
         return temp_output
@@ -114,7 +212,8 @@ def reproject_raster(input_path: str, target_crs: str, temp_output: str, nodata_
 
 def adjust_dimensions_raster(
     input_path: str, ref_transform: tuple, ref_width: int, ref_height: int,
-    temp_output: str, nodata_value
+    temp_output: str, nodata_value, target_crs: Optional[str] = None,
+    metrics: Optional[dict] = None
 ) -> str:
     dataset = gdal.Open(input_path)
     if not dataset:
@@ -128,13 +227,16 @@ def adjust_dimensions_raster(
     adjusted_ds = gdal.Warp(
         temp_output,
         dataset,
+        dstSRS=target_crs,
         width=ref_width,
         height=ref_height,
         resampleAlg=gdal.GRA_NearestNeighbour,
         outputBounds=(xmin, ymin, xmax, ymax),
-        dstNodata=nodata_value
+        dstNodata=nodata_value,
+        **warp_kwargs(),
     )
-    print(f"[**] Ajustando dimensiones {input_path} → {temp_output} ({ref_width}x{ref_height})")
+    inc(WARP_CALLS, job=metrics, kind="adjust")
+    log.debug("Ajustando dimensiones %s → %s (%dx%d)", input_path, temp_output, ref_width, ref_height)
     if adjusted_ds:
         adjusted_ds = None
         return temp_output
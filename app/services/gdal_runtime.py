@@ -0,0 +1,175 @@
+# app/services/gdal_runtime.py
+"""
+Configuración de runtime de GDAL (caché de bloques, hilos, Warp, VSI).
+Los valores se derivan de la CPU/RAM del host salvo que se definan en el
+entorno (.env). Se aplica una vez por proceso: al arrancar la app y en el
+inicializador de cualquier proceso worker (`init_worker`).
+"""
+from __future__ import annotations
+from osgeo import gdal
+from pathlib import Path
+from typing import Any, Dict, Optional
+import logging
+import os
+import re
+
+from app.config import (
+    GDAL_CACHEMAX, GDAL_NUM_THREADS, GDAL_DISABLE_READDIR_ON_OPEN,
+    GDAL_WARP_MULTITHREAD, GDAL_WARP_MEMORY_LIMIT, VSI_CACHE, VSI_CACHE_SIZE,
+    LOG_LEVEL, LOG_FORMAT,
+)
+from app.utils.logging_utils import configure_logging
+
+gdal.UseExceptions()
+log = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+_applied: Optional[Dict[str, Any]] = None
+
+
+def host_cpu_count() -> int:
+    """CPUs disponibles para este proceso (respeta afinidad/cpuset)."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def host_memory_bytes() -> int:
+    """RAM disponible: la menor entre la física y el límite del cgroup (contenedores)."""
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        total = 0
+    for limit_file in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            raw = Path(limit_file).read_text().strip()
+        except OSError:
+            continue
+        if raw.isdigit() and 0 < int(raw) < (total or int(raw) + 1):
+            total = int(raw)
+        break
+    return total or 2048 * MB  # sin información: asume 2 GiB
+
+
+_SIZE_UNITS = {"": None, "B": 1, "K": 1024, "KB": 1024, "M": MB, "MB": MB, "G": 1024 * MB, "GB": 1024 * MB}
+
+
+def _parse_size(name: str, value: Optional[str], unit: int, default: int) -> int:
+    """
+    Tamaño de `value` expresado en `unit` bytes. Acepta "512" (ya en `unit`)
+    o con sufijo ("512MB", "1G", "65536B"). Si no se puede leer, avisa en el
+    log y usa `default`.
+    """
+    if value is None or value.strip() == "":
+        return default
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([A-Za-z]*)\s*", value)
+    suffix = match.group(2).upper() if match else None
+    if not match or suffix not in _SIZE_UNITS:
+        log.warning("Valor inválido %s=%r; se usa el derivado (%s).", name, value, default)
+        return default
+    factor = _SIZE_UNITS[suffix]
+    number = float(match.group(1))
+    return max(1, int(number if factor is None else number * factor / unit))
+
+
+def _parse_cache_max(value: Optional[str], ram_mb: int, default: int) -> int:
+    """
+    GDAL_CACHEMAX en MB. Además de los tamaños de _parse_size acepta un
+    porcentaje de la RAM ("10%"), como GDAL. Si no se puede leer, avisa y usa
+    `default`.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*%\s*", value or "")
+    if match:
+        return max(1, int(ram_mb * float(match.group(1)) / 100))
+    return _parse_size("GDAL_CACHEMAX", value, MB, default)
+
+
+def _flag(value: Optional[str], default: bool) -> bool:
+    if value is None or value == "":
+        return default
+    return value.strip().upper() in ("1", "TRUE", "YES", "ON")
+
+
+def derive_settings() -> Dict[str, Any]:
+    """
+    Valores efectivos: los del entorno si existen; si no, derivados del host.
+    - GDAL_CACHEMAX: 10 % de la RAM (64 MB – 4 GB).
+    - GDAL_NUM_THREADS: todas las CPUs disponibles.
+    - Warp: multihilo y límite de memoria del 5 % de la RAM (64 MB – 1 GB).
+    - GDAL_DISABLE_READDIR_ON_OPEN=EMPTY_DIR y caché VSI de 64 MB.
+    """
+    cpus = host_cpu_count()
+    ram_mb = host_memory_bytes() // MB
+
+    return {
+        "GDAL_CACHEMAX": _parse_cache_max(GDAL_CACHEMAX, ram_mb, min(4096, max(64, ram_mb // 10))),
+        "GDAL_NUM_THREADS": str(GDAL_NUM_THREADS or cpus),
+        "GDAL_DISABLE_READDIR_ON_OPEN": GDAL_DISABLE_READDIR_ON_OPEN or "EMPTY_DIR",
+        "VSI_CACHE": "TRUE" if _flag(VSI_CACHE, True) else "FALSE",
+        "VSI_CACHE_SIZE": _parse_size("VSI_CACHE_SIZE", VSI_CACHE_SIZE, 1, 64 * MB),
+        "warp_multithread": _flag(GDAL_WARP_MULTITHREAD, cpus > 1),
+        "warp_memory_limit_mb": _parse_size(
+            "GDAL_WARP_MEMORY_LIMIT", GDAL_WARP_MEMORY_LIMIT, MB, min(1024, max(64, ram_mb // 20))
+        ),
+        "host_cpus": cpus,
+        "host_memory_mb": ram_mb,
+    }
+
+
+_CONFIG_OPTIONS = (
+    "GDAL_CACHEMAX", "GDAL_NUM_THREADS", "GDAL_DISABLE_READDIR_ON_OPEN",
+    "VSI_CACHE", "VSI_CACHE_SIZE",
+)
+
+
+def apply_gdal_runtime(force: bool = False) -> Dict[str, Any]:
+    """
+    Aplica la configuración con gdal.SetConfigOption y la exporta al entorno
+    para que la hereden los procesos hijos. Idempotente; retorna los valores
+    efectivos y los reporta en el log.
+    """
+    global _applied
+    if _applied is not None and not force:
+        return _applied
+
+    settings = derive_settings()
+    for key in _CONFIG_OPTIONS:
+        value = str(settings[key])
+        gdal.SetConfigOption(key, value)
+        os.environ[key] = value
+    gdal.SetCacheMax(settings["GDAL_CACHEMAX"] * MB)
+
+    # lo que GDAL realmente tomó (p. ej. si rechazó algún valor)
+    settings["effective"] = {key: gdal.GetConfigOption(key) for key in _CONFIG_OPTIONS}
+    settings["effective"]["cache_max_bytes"] = gdal.GetCacheMax()
+    settings["gdal_version"] = gdal.__version__
+
+    log.info(
+        "Configuración GDAL aplicada: %s",
+        ", ".join(f"{k}={v}" for k, v in settings.items() if k != "effective"),
+        extra={"gdal_runtime": settings},
+    )
+    _applied = settings
+    return settings
+
+
+def init_worker() -> None:
+    """
+    Inicializador para ProcessPoolExecutor/multiprocessing (`initializer=init_worker`).
+    Configura el logging antes de aplicar GDAL para que el reporte de inicio
+    también aparezca en los workers.
+    """
+    configure_logging(LOG_LEVEL, LOG_FORMAT)
+    apply_gdal_runtime()
+
+
+def warp_kwargs() -> Dict[str, Any]:
+    """Opciones de gdal.Warp (multihilo y límite de memoria) según la configuración aplicada."""
+    settings = apply_gdal_runtime()
+    kwargs: Dict[str, Any] = {"warpMemoryLimit": settings["warp_memory_limit_mb"] * MB}
+    if settings["warp_multithread"]:
+        kwargs["multithread"] = True
+        kwargs["warpOptions"] = [f"NUM_THREADS={settings['GDAL_NUM_THREADS']}"]
+    return kwargs
@@ -0,0 +1,162 @@
+# app/services/output_types.py
+from __future__ import annotations
+from osgeo import gdal
+from typing import Any, Dict, List
+import math
+import numpy as np
+
+gdal.UseExceptions()
+
+# Rango de valores válidos en las capas de entrada (categorías 0–7)
+VALID_MIN = 0.0
+VALID_MAX = 7.0
+
+# Tipos enteros candidatos: (tipo GDAL, dtype numpy, código máximo de datos, nodata)
+# El nodata queda fuera del rango de códigos para no colisionar con datos válidos.
+_INT_TYPES = (
+    (gdal.GDT_Byte, np.uint8, 254, 255),
+    (gdal.GDT_UInt16, np.uint16, 65534, 65535),
+)
+
+# NoData de Float32 cuando el de la entrada cae dentro del rango de resultados
+FLOAT_NODATA = float(np.finfo(np.float32).min)
+
+_INTEGER_GDAL_TYPES = {
+    gdal.GDT_Byte, gdal.GDT_Int8, gdal.GDT_UInt16, gdal.GDT_Int16,
+    gdal.GDT_UInt32, gdal.GDT_Int32,
+}
+
+
+def output_value_range(multipliers: List[float]) -> tuple:
+    """Rango (min, max) de la suma ponderada con entradas en [VALID_MIN, VALID_MAX]."""
+    lo = sum(min(VALID_MIN * m, VALID_MAX * m) for m in multipliers)
+    hi = sum(max(VALID_MIN * m, VALID_MAX * m) for m in multipliers)
+    return lo, hi
+
+
+def band_is_integer(band: gdal.Band) -> bool:
+    """True si la banda guarda enteros sin escala/offset (valores reales enteros)."""
+    scale = band.GetScale()
+    offset = band.GetOffset()
+    return (
+        band.DataType in _INTEGER_GDAL_TYPES
+        and scale in (None, 1.0)
+        and offset in (None, 0.0)
+    )
+
+
+def _float32_plan(nodata: float) -> Dict[str, Any]:
+    return {
+        "gdal_type": gdal.GDT_Float32,
+        "dtype": np.float32,
+        "nodata": nodata,
+        "scale": None,
+        "offset": None,
+    }
+
+
+def select_output_type(
+    multipliers: List[float],
+    inputs_integer: bool,
+    tolerance: float,
+    float_nodata: float,
+) -> Dict[str, Any]:
+    """
+    Elige el tipo de salida más compacto a partir del rango que producen los
+    multiplicadores:
+    - enteros exactos (entradas y multiplicadores enteros) → Byte/UInt16 directo;
+    - si no, enteros con scale/offset si el error de cuantización ≤ `tolerance`;
+    - Float32 sólo si nada de lo anterior alcanza; usa `float_nodata` salvo que
+      caiga dentro del rango de resultados, en cuyo caso usa FLOAT_NODATA.
+    Retorna un dict con gdal_type, dtype, nodata, scale y offset.
+    """
+    lo, hi = output_value_range(multipliers)
+    exact = inputs_integer and all(float(m).is_integer() for m in multipliers)
+
+    if exact:
+        for gdal_type, dtype, max_code, nodata in _INT_TYPES:
+            if lo >= 0 and hi <= max_code:
+                return {
+                    "gdal_type": gdal_type,
+                    "dtype": dtype,
+                    "nodata": nodata,
+                    "scale": None,
+                    "offset": None,
+                }
+            if lo < 0 and hi - lo <= max_code:
+                # negativos: se desplaza con offset y escala 1 (sigue siendo exacto)
+                return {
+                    "gdal_type": gdal_type,
+                    "dtype": dtype,
+                    "nodata": nodata,
+                    "scale": 1.0,
+                    "offset": lo,
+                }
+
+    if tolerance and tolerance > 0 and math.isfinite(lo) and math.isfinite(hi):
+        for gdal_type, dtype, max_code, nodata in _INT_TYPES:
+            scale = (hi - lo) / max_code if hi > lo else 1.0
+            # el redondeo al código más cercano introduce a lo sumo scale/2 de error
+            if scale / 2.0 <= tolerance:
+                return {
+                    "gdal_type": gdal_type,
+                    "dtype": dtype,
+                    "nodata": nodata,
+                    "scale": scale,
+                    "offset": lo,
+                }
+
+    if lo <= float_nodata <= hi:
+        # el nodata de entrada (255 por defecto) puede ser un resultado real
+        return _float32_plan(FLOAT_NODATA)
+    return _float32_plan(float_nodata)
+
+
+def encode_block(values: np.ndarray, valid: np.ndarray, plan: Dict[str, Any]) -> np.ndarray:
+    """Convierte valores reales al tipo de salida, con nodata donde `valid` es False."""
+    dtype = plan["dtype"]
+    if plan["gdal_type"] == gdal.GDT_Float32:
+        return np.where(valid, values, plan["nodata"]).astype(dtype, copy=False)
+
+    if plan["scale"] is not None:
+        values = (values - plan["offset"]) / plan["scale"]
+    info = np.iinfo(dtype)
+    # el código máximo del tipo está reservado para nodata
+    codes = np.clip(np.rint(values), info.min, info.max - 1)
+    return np.where(valid, codes, plan["nodata"]).astype(dtype)
+
+
+def nodata_block(shape: tuple, plan: Dict[str, Any]) -> np.ndarray:
+    return np.full(shape, plan["nodata"], dtype=plan["dtype"])
+
+
+def decode_array(array: np.ndarray, band: gdal.Band) -> np.ndarray:
+    """Valores reales (float32) de un bloque leído, aplicando scale/offset de la banda."""
+    array = array.astype(np.float32)
+    scale = band.GetScale()
+    offset = band.GetOffset()
+    if scale not in (None, 1.0) or offset not in (None, 0.0):
+        array = array * np.float32(scale if scale is not None else 1.0) \
+            + np.float32(offset or 0.0)
+    return array
+
+
+def decode_valid(raw: np.ndarray, band: gdal.Band) -> tuple:
+    """
+    (valores, máscara de válidos) de un bloque leído de `band`.
+    Válidos: no nodata, finitos y dentro de [VALID_MIN, VALID_MAX]. Si la banda
+    está cuantizada con scale/offset el rango se amplía en scale/2 (error de
+    redondeo al guardar) y los valores se recortan al rango, para que un 7.0
+    de stage1 no vuelva como 7.00004 y se descarte en stage2.
+    """
+    values = decode_array(raw, band)
+    scale = band.GetScale()
+    tol = abs(scale) / 2.0 if scale not in (None, 1.0) else 0.0
+
+    valid = np.isfinite(values) & (values >= VALID_MIN - tol) & (values <= VALID_MAX + tol)
+    nodata = band.GetNoDataValue()
+    if nodata is not None:
+        valid &= raw != nodata
+    if tol:
+        values = np.clip(values, VALID_MIN, VALID_MAX)
+    return values, valid
@@ -3,13 +3,25 @@ from __future__ import annotations
 from osgeo import gdal, osr
 from pathlib import Path
 from typing import List, Optional
+import logging
 import numpy as np
 import os
+import time
 
 from app.services.gdal_operations import check_and_align_rasters
+from app.services.aoi import prepare_aoi_mask, aoi_block_mask
+from app.services.output_types import (
+    band_is_integer, select_output_type,
+    encode_block, nodata_block, decode_valid,
+)
+from app.config import OUTPUT_SCALE_TOLERANCE
+from app.utils.metrics import BLOCKS, BYTES, inc, observe_stage, stage_timer
 from fastapi.responses import JSONResponse  # ← sólo si usas compute_bbox_4326 aquí
 
 gdal.UseExceptions()  # opcional pero útil
+log = logging.getLogger(__name__)
+
+OUTPUT_TYPES = {"auto", "float32"}
 
 BLOCK_SIZE = 256  # Tamaño de bloque para procesamiento en memoria
 
@@ -27,14 +39,29 @@ def process_rasters(
     output_path: str,
     temp_dir: Optional[str] = None,
     aligned_dir: Optional[str] = None,
+    aoi=None,
+    output_type: str = "auto",
+    scale_tolerance: Optional[float] = None,
+    metrics: Optional[dict] = None,
 ) -> str:
     """
     Suma ponderada de rásters (bloque a bloque), escribiendo en `output_path`.
     Usa `temp_dir`/`aligned_dir` si se proveen; si no, usa defaults.
+    Si se pasa `aoi` (ogr.Geometry, ver app.services.aoi.parse_aoi) la salida
+    cubre sólo la ventana del AOI; bloques fuera del polígono se omiten y los
+    píxeles fuera de él quedan en NoData.
+    `output_type="auto"` elige Byte/UInt16 (directo o con scale/offset dentro de
+    `scale_tolerance`, por defecto OUTPUT_SCALE_TOLERANCE) según el rango que
+    dan los multiplicadores; `"float32"` fuerza la salida Float32 de siempre.
+    `metrics` (dict del job) acumula tiempos por etapa (align, block_loop,
+    write, statistics), bloques y bytes; ver app.utils.metrics.
     """
 
+    if output_type not in OUTPUT_TYPES:
+        raise ValueError(f"output_type inválido: {output_type!r}. Usa uno de {sorted(OUTPUT_TYPES)}.")
+
     if len(input_paths) != len(multipliers):
-        print("[X]  Error: Listas de archivos y multiplicadores deben tener la misma longitud.")
+        log.error("Listas de archivos y multiplicadores deben tener la misma longitud.")
         return ""
 
     temp_dir_p = Path(temp_dir) if temp_dir else UPLOAD_FOLDER_TEMP_DEFAULT
@@ -47,15 +74,18 @@ def process_rasters(
     out_path_p.parent.mkdir(parents=True, exist_ok=True)
 
     # 1) Alinear escribiendo en `aligned_p` 
-    aligned_paths = check_and_align_rasters(input_paths, aligned_dir=str(aligned_p))
+    with stage_timer("align", metrics):
+        aligned_paths = check_and_align_rasters(
+            input_paths, aligned_dir=str(aligned_p), aoi=aoi, metrics=metrics
+        )
     if not aligned_paths:
-        print("[X] Error: No se generaron archivos alineados.")
+        log.error("No se generaron archivos alineados.")
         return ""
 
     # 2) Dataset base
     base_dataset = gdal.Open(aligned_paths[0])
     if not base_dataset:
-        print(" [X] Error: No se pudo abrir la capa base.")
+        log.error("No se pudo abrir la capa base.")
         return ""
 
     base_crs = base_dataset.GetProjection()
@@ -63,27 +93,63 @@ def process_rasters(
     base_width = base_dataset.RasterXSize
     base_height = base_dataset.RasterYSize
 
+    nodata_base = base_dataset.GetRasterBand(1).GetNoDataValue()
+    if nodata_base is None:
+        nodata_base = 255.0
+
+    # AOI sobre la grilla de salida (ya recortada a su ventana); se rasteriza por
+    # bloque en el bucle. Se prepara antes de crear la salida para fallar sin
+    # dejar archivos vacíos
+    aoi_mask_src = None
+    if aoi is not None:
+        aoi_mask_src = prepare_aoi_mask(aoi, base_crs, base_transform, base_width, base_height)
+
+    # Tipo de salida según el rango de la suma ponderada
+    if output_type == "float32":
+        inputs_integer, tolerance = False, 0.0
+    else:
+        inputs_integer = all(band_is_integer(gdal.Open(path).GetRasterBand(1)) for path in aligned_paths)
+        tolerance = OUTPUT_SCALE_TOLERANCE if scale_tolerance is None else scale_tolerance
+    plan = select_output_type(multipliers, inputs_integer, tolerance, nodata_base)
+    log.info("Tipo de salida: %s (scale=%s, offset=%s, nodata=%s)",
+             gdal.GetDataTypeName(plan["gdal_type"]), plan["scale"], plan["offset"], plan["nodata"])
+
     driver = gdal.GetDriverByName('GTiff')
-    output_dataset = driver.Create(str(out_path_p), base_width, base_height, 1, gdal.GDT_Float32)
+    output_dataset = driver.Create(str(out_path_p), base_width, base_height, 1, plan["gdal_type"])
     if output_dataset is None:
-        print(" [X] Error: No se pudo crear el archivo vacío de salida.")
+        log.error("No se pudo crear el archivo vacío de salida.")
         return ""
 
     output_dataset.SetGeoTransform(base_transform)
     output_dataset.SetProjection(base_crs)
     out_band = output_dataset.GetRasterBand(1)
-
-    nodata_base = base_dataset.GetRasterBand(1).GetNoDataValue()
-    if nodata_base is None:
-        nodata_base = 255.0
-    out_band.SetNoDataValue(nodata_base)
+    out_band.SetNoDataValue(plan["nodata"])
+    if plan["scale"] is not None:
+        out_band.SetScale(plan["scale"])
+        out_band.SetOffset(plan["offset"])
 
     # 3) Cálculo bloque a bloque
+    # contadores locales: se publican una vez al final para no tocar el registro en el bucle
+    debug = log.isEnabledFor(logging.DEBUG)
+    blocks_processed = blocks_skipped = bytes_read = 0
+    write_s = 0.0
+    t_loop = time.perf_counter()
     for y in range(0, base_height, BLOCK_SIZE):
         block_height = min(BLOCK_SIZE, base_height - y)
         for x in range(0, base_width, BLOCK_SIZE):
             block_width = min(BLOCK_SIZE, base_width - x)
 
+            aoi_mask = None
+            if aoi_mask_src is not None:
+                aoi_mask = aoi_block_mask(aoi_mask_src, x, y, block_width, block_height)
+                if not aoi_mask.any():
+                    # bloque completamente fuera del AOI: no se leen entradas
+                    t_write = time.perf_counter()
+                    out_band.WriteArray(nodata_block((block_height, block_width), plan), x, y)
+                    write_s += time.perf_counter() - t_write
+                    blocks_skipped += 1
+                    continue
+
             sum_block = np.zeros((block_height, block_width), dtype=np.float32)
             valid_mask_global_0_7 = np.ones_like(sum_block, dtype=bool)
 
@@ -91,36 +157,55 @@ def process_rasters(
                 multiplier = multipliers[i]
                 dataset = gdal.Open(input_path)
                 if not dataset:
-                    print(f"[X]  Error al abrir el raster {input_path} para el bloque ({x},{y}).")
+                    log.error("Error al abrir el raster %s para el bloque (%d,%d).", input_path, x, y)
                     continue
 
                 band = dataset.GetRasterBand(1)
-                nodata = band.GetNoDataValue()
-                if nodata is None:
-                    nodata = 255.0
 
-                array = band.ReadAsArray(x, y, block_width, block_height)
-                if array is None:
+                raw = band.ReadAsArray(x, y, block_width, block_height)
+                if raw is None:
                     continue
+                bytes_read += raw.nbytes
 
-                array = array.astype(np.float32)
-                valid_mask_0_7 = ((array >= 0) & (array <= 7)) & (~np.isnan(array)) & (~np.isinf(array))
+                # valores reales (aplica scale/offset si la entrada es una salida compacta)
+                array, valid_mask_0_7 = decode_valid(raw, band)
 
                 sum_block += np.where(valid_mask_0_7, array * multiplier, 0)
                 valid_mask_global_0_7 &= valid_mask_0_7
 
-            # Donde no hay datos válidos, asignar NoData
-            sum_block = np.where(valid_mask_global_0_7, sum_block, nodata_base)
+            if aoi_mask is not None:
+                valid_mask_global_0_7 &= aoi_mask
+
+            # Donde no hay datos válidos, asignar NoData (y codificar al tipo de salida)
+            out_block = encode_block(sum_block, valid_mask_global_0_7, plan)
+
+            # Debug ruidoso: sólo se calcula con LOG_LEVEL=DEBUG
+            if debug:
+                log.debug("Block (%d,%d) stats: min=%s, max=%s",
+                          x, y, np.nanmin(sum_block), np.nanmax(sum_block))
+
+            t_write = time.perf_counter()
+            out_band.WriteArray(out_block, x, y)
+            write_s += time.perf_counter() - t_write
+            blocks_processed += 1
+
+    observe_stage("block_loop", time.perf_counter() - t_loop - write_s, metrics)
 
-            # (opcional) Debug ruidoso: Solo para verificación
-            # print(f"- Block ({x},{y}) stats: min={np.nanmin(sum_block)}, max={np.nanmax(sum_block)}")
+    with stage_timer("statistics", metrics):
+        out_band.ComputeStatistics(False)
 
-            out_band.WriteArray(sum_block, x, y)
+    t_write = time.perf_counter()
+    out_band, output_dataset = None, None  # cierra y vuelca a disco
+    write_s += time.perf_counter() - t_write
+    observe_stage("write", write_s, metrics)
+    aoi_mask_src = None
 
-    out_band.ComputeStatistics(False)
-    out_band, output_dataset = None, None
+    inc(BLOCKS, blocks_processed, job=metrics, state="processed")
+    inc(BLOCKS, blocks_skipped, job=metrics, state="skipped")
+    inc(BYTES, bytes_read, job=metrics, direction="read")
+    inc(BYTES, out_path_p.stat().st_size, job=metrics, direction="written")
 
-    print(f"[OK] Raster generado en: {out_path_p}")
+    log.info("Raster generado en: %s", out_path_p)
     return str(out_path_p)
 
 
@@ -0,0 +1,48 @@
+# app/utils/logging_utils.py
+from __future__ import annotations
+import json
+import logging
+import sys
+import time
+
+# Atributos estándar de LogRecord; lo demás viene de `extra=` y se serializa
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, incluyendo los campos pasados con `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+def configure_logging(level: str = "INFO", fmt: str = "json") -> None:
+    """
+    Configura el logger raíz una sola vez: nivel `level` y salida `json`
+    (una línea por evento) o `text`.
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    if fmt == "text":
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        if getattr(h, "_mapstore_gdal", False):
+            root.removeHandler(h)
+    handler._mapstore_gdal = True
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
@@ -0,0 +1,158 @@
+# app/utils/metrics.py
+"""
+Métricas en memoria del proceso (contadores e histogramas) con exposición
+en formato de texto de Prometheus para `/metrics`.
+Cada helper acepta además un dict `job` opcional donde se acumulan los mismos
+valores por job, para guardarlos en el manifest.
+"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+import threading
+import time
+
+_LOCK = threading.Lock()
+_REGISTRY: List["_Metric"] = []
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        with _LOCK:
+            _REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with _LOCK:
+            lines += self._samples()
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Líneas de muestra en formato Prometheus (se llama con _LOCK tomado)."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with _LOCK:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with _LOCK:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1  # +Inf
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, counts in self._counts.items():
+            for bound, c in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {c}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {counts[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {counts[-1]}")
+        return lines
+
+
+def render_prometheus() -> str:
+    with _LOCK:
+        metrics = list(_REGISTRY)
+    lines: List[str] = []
+    for metric in metrics:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+# --- Métricas del backend -------------------------------------------------
+
+STAGE_DURATION = Histogram(
+    "gdal_backend_stage_duration_seconds",
+    "Duración de cada etapa del procesamiento (save_inputs, align, block_loop, statistics, write).",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+JOB_DURATION = Histogram(
+    "gdal_backend_job_duration_seconds",
+    "Duración total de cada llamada al pipeline.",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+JOBS = Counter("gdal_backend_jobs_total", "Llamadas al pipeline por etapa y resultado (ok, error, rejected).")
+BYTES = Counter("gdal_backend_bytes_total", "Bytes procesados por dirección (upload, read, written).")
+BLOCKS = Counter("gdal_backend_blocks_total", "Bloques del cálculo por estado (processed, skipped).")
+WARP_CALLS = Counter("gdal_backend_warp_calls_total", "Llamadas a gdal.Warp por tipo (reproject, adjust).")
+
+
+def _job_add(job: Optional[dict], section: str, key: str, amount: float) -> None:
+    if job is None:
+        return
+    bucket = job.setdefault(section, {})
+    bucket[key] = round(bucket.get(key, 0) + amount, 6)
+
+
+def inc(counter: Counter, amount: float = 1.0, job: Optional[dict] = None, **labels) -> None:
+    """Incrementa `counter` y, si se pasa `job`, el mismo valor en job["counters"]."""
+    counter.inc(amount, **labels)
+    key = "_".join([counter.name.replace("gdal_backend_", "").replace("_total", "")]
+                   + [str(v) for _, v in _label_key(labels)])
+    _job_add(job, "counters", key, amount)
+
+
+def observe_stage(stage: str, seconds: float, job: Optional[dict] = None) -> None:
+    """Registra `seconds` para la etapa `stage` en STAGE_DURATION y en job["stages_s"]."""
+    STAGE_DURATION.observe(seconds, stage=stage)
+    _job_add(job, "stages_s", stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str, job: Optional[dict] = None) -> Iterator[None]:
+    """Mide el bloque `with` como la etapa `stage` (ver observe_stage)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - t0, job)
@@ -0,0 +1,359 @@
+# benchmarks/run.py
+"""
+Benchmarks del pipeline de procesamiento.
+
+    python -m benchmarks.run --size 4096 --count 7 --output bench.json
+    python -m benchmarks.run compare antes.json despues.json
+
+Cada caso corre en un proceso propio para que el pico de RSS y los bytes de
+E/S sean sólo los de ese caso. El caso `pipeline` requiere `httpx`
+(usado por el TestClient de FastAPI).
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CASES = ("align", "process", "pipeline")
+STAGE1_LAYERS = 7  # /pipeline/continue espera 7 salidas de stage1
+
+
+def _io_counters() -> Dict[str, Optional[int]]:
+    """Bytes leídos/escritos por el proceso (Linux: /proc/self/io)."""
+    try:
+        fields = dict(
+            line.split(": ") for line in Path("/proc/self/io").read_text().splitlines()
+        )
+        return {"read": int(fields["rchar"]), "written": int(fields["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return {"read": None, "written": None}
+
+
+def _proc_status_bytes(field: str) -> Optional[int]:
+    """Campo de memoria de /proc/self/status (VmRSS, VmHWM) en bytes."""
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024  # viene en kB
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """Reinicia VmHWM al RSS actual (Linux >= 4.0); False si no se pudo."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        return False
+    return _proc_status_bytes("VmHWM") is not None
+
+
+def _peak_rss_bytes(reset: bool) -> Tuple[int, str]:
+    """
+    Pico de RSS y su origen. Con `reset` (VmHWM reiniciado antes de medir) es
+    el pico de la parte medida; si no, ru_maxrss cubre toda la vida del proceso,
+    incluidos imports y setup.
+    """
+    if reset:
+        hwm = _proc_status_bytes("VmHWM")
+        if hwm is not None:
+            return hwm, "VmHWM"
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss viene en KiB en Linux y en bytes en macOS
+    return (peak if sys.platform == "darwin" else peak * 1024), "ru_maxrss"
+
+
+def _count_gdal_opens(counter: Dict[str, int]) -> None:
+    """
+    Cuenta aperturas de datasets en todo el proceso: llamadas a gdal.Open/OpenEx
+    y orígenes dados como ruta en gdal.Warp/Translate (que GDAL abre por dentro).
+    Sólo ve la API de Python; aperturas internas de GDAL (p. ej. las fuentes de
+    un VRT) no se cuentan.
+    """
+    from osgeo import gdal
+
+    def wrap(name, sources=None):
+        original = getattr(gdal, name)
+
+        def counted(*args, **kwargs):
+            if sources is None:
+                counter[name] = counter.get(name, 0) + 1
+            else:
+                src = args[1] if len(args) > 1 else kwargs.get(sources)
+                paths = src if isinstance(src, (list, tuple)) else [src]
+                n = sum(isinstance(p, (str, os.PathLike)) for p in paths)
+                if n:
+                    counter[name] = counter.get(name, 0) + n
+            return original(*args, **kwargs)
+
+        setattr(gdal, name, counted)
+
+    wrap("Open")
+    wrap("OpenEx")
+    wrap("Warp", sources="srcDSOrSrcDSTab")
+    wrap("Translate", sources="srcDS")
+
+
+def _setup_align(params: Dict[str, Any], work: Path) -> Tuple[Callable[[], None], Callable[[], None]]:
+    from app.services.gdal_operations import check_and_align_rasters
+
+    def measured() -> None:
+        aligned = check_and_align_rasters(params["inputs"], aligned_dir=str(work / "aligned"))
+        if len(aligned) != len(params["inputs"]):
+            raise RuntimeError("check_and_align_rasters no devolvió todas las capas")
+
+    return measured, lambda: None
+
+
+def _setup_process(params: Dict[str, Any], work: Path) -> Tuple[Callable[[], None], Callable[[], None]]:
+    from app.services.process_rasters import process_rasters
+
+    def measured() -> None:
+        result = process_rasters(
+            input_paths=params["inputs"],
+            multipliers=params["multipliers"],
+            output_path=str(work / "out.tif"),
+            temp_dir=str(work / "tmp"),
+            aligned_dir=str(work / "aligned"),
+        )
+        if not result:
+            raise RuntimeError("process_rasters no generó salida")
+
+    return measured, lambda: None
+
+
+def _setup_pipeline(params: Dict[str, Any], work: Path) -> Tuple[Callable[[], None], Callable[[], None]]:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    state: Dict[str, Optional[str]] = {"job_id": None}
+
+    def measured() -> None:
+        for i in range(STAGE1_LAYERS):
+            files = [
+                ("files", (Path(p).name, open(p, "rb"), "image/tiff"))
+                for p in params["inputs"]
+            ]
+            data = {
+                "multipliers": ",".join(str(m) for m in params["multipliers"]),
+                "output_filename": f"stage1_{i}.tif",
+            }
+            if state["job_id"]:
+                data["job_id"] = state["job_id"]
+            try:
+                r = client.post("/pipeline/start", files=files, data=data)
+            finally:
+                for _, (_, fh, _) in files:
+                    fh.close()
+            r.raise_for_status()
+            state["job_id"] = r.json()["job_id"]
+
+        r = client.post("/pipeline/continue", data={"job_id": state["job_id"]})
+        r.raise_for_status()
+
+    def cleanup() -> None:
+        if state["job_id"]:
+            client.delete(f"/pipeline/{state['job_id']}")
+
+    return measured, cleanup
+
+
+# Cada setup importa dependencias y prepara clientes fuera de la medición;
+# retorna (parte medida, limpieza no medida).
+_SETUPS = {"align": _setup_align, "process": _setup_process, "pipeline": _setup_pipeline}
+
+
+def _run_case(case: str, params: Dict[str, Any], queue) -> None:
+    """Cuerpo del proceso hijo: mide un caso y deja el resultado en `queue`."""
+    os.chdir(REPO_ROOT)  # las rutas por defecto de la app son relativas al repo
+    sys.path.insert(0, str(REPO_ROOT))
+    from app.services.gdal_runtime import init_worker
+    init_worker()  # misma configuración GDAL que la app
+
+    work = Path(tempfile.mkdtemp(prefix=f"bench_{case}_"))
+    error = None
+    measured = cleanup = None
+    try:
+        measured, cleanup = _SETUPS[case](params, work)
+    except Exception as e:
+        error = f"setup {type(e).__name__}: {e}"
+
+    # sólo se cuentan aperturas, E/S y tiempo de la parte medida
+    opens: Dict[str, int] = {}
+    _count_gdal_opens(opens)
+    rss_before = _proc_status_bytes("VmRSS")
+    peak_reset = _reset_peak_rss()
+    io_before = _io_counters()
+    t0 = time.perf_counter()
+    if measured is not None:
+        try:
+            measured()
+        except Exception as e:  # el resultado registra el fallo, no aborta la corrida
+            error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - t0
+    io_after = _io_counters()
+    peak_rss, peak_source = _peak_rss_bytes(peak_reset)
+
+    if cleanup is not None:
+        try:
+            cleanup()
+        except Exception:
+            pass
+    shutil.rmtree(work, ignore_errors=True)
+
+    def delta(key):
+        if io_before[key] is None or io_after[key] is None:
+            return None
+        return io_after[key] - io_before[key]
+
+    queue.put({
+        "case": case,
+        "ok": error is None,
+        "error": error,
+        "wall_time_s": round(wall, 4),
+        "peak_rss_bytes": peak_rss,
+        "peak_rss_source": peak_source,
+        "rss_before_bytes": rss_before,
+        # crecimiento de memoria atribuible a la parte medida
+        "peak_rss_delta_bytes": None if rss_before is None else peak_rss - rss_before,
+        "bytes_read": delta("read"),
+        "bytes_written": delta("written"),
+        "gdal_open_count": sum(opens.values()),
+    })
+
+
+def run_case(case: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(case, params, queue))
+    proc.start()
+    proc.join()
+    if not queue.empty():
+        return queue.get()
+    return {"case": case, "ok": False, "error": f"proceso terminó con código {proc.exitcode}"}
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from benchmarks.synthetic import make_inputs
+
+    width = args.width or args.size
+    height = args.height or args.size
+    data_dir = Path(tempfile.mkdtemp(prefix="bench_data_"))
+    try:
+        inputs = make_inputs(
+            str(data_dir), args.count, width, height,
+            dtype=args.dtype, tiled=not args.striped, block_size=args.block_size,
+            nodata_fraction=args.nodata_fraction, mismatched=args.mismatched,
+            compress=args.compress, seed=args.seed,
+        )
+        multipliers = [round(1.0 / args.count, 6)] * args.count
+        params = {"inputs": inputs, "multipliers": multipliers}
+
+        results: List[Dict[str, Any]] = []
+        for case in args.cases:
+            for rep in range(args.repeat):
+                res = run_case(case, params)
+                res["repeat"] = rep
+                results.append(res)
+                status = "ok" if res["ok"] else f"ERROR {res['error']}"
+                print(f"[**] {case} #{rep}: {res.get('wall_time_s')} s ({status})", file=sys.stderr)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {
+        "created_at": time.time(),
+        "host": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {
+            "width": width, "height": height, "count": args.count, "dtype": args.dtype,
+            "tiled": not args.striped, "block_size": args.block_size,
+            "nodata_fraction": args.nodata_fraction, "mismatched": args.mismatched,
+            "compress": args.compress, "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def _best(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Mejor repetición (menor tiempo) por caso."""
+    best: Dict[str, Dict[str, Any]] = {}
+    for r in results:
+        if not r.get("ok"):
+            continue
+        if r["case"] not in best or r["wall_time_s"] < best[r["case"]]["wall_time_s"]:
+            best[r["case"]] = r
+    return best
+
+
+def compare(baseline_path: str, candidate_path: str) -> None:
+    """Imprime, por caso y métrica, el valor de ambas corridas y el cociente."""
+    base = _best(json.loads(Path(baseline_path).read_text())["results"])
+    cand = _best(json.loads(Path(candidate_path).read_text())["results"])
+    metrics = ("wall_time_s", "peak_rss_bytes", "peak_rss_delta_bytes",
+               "bytes_read", "bytes_written", "gdal_open_count")
+
+    print(f"{'caso':<10} {'métrica':<20} {'base':>14} {'nuevo':>14} {'ratio':>8}")
+    for case in CASES:
+        if case not in base or case not in cand:
+            continue
+        for metric in metrics:
+            a, b = base[case].get(metric), cand[case].get(metric)
+            ratio = f"{b / a:.3f}" if a and b is not None else "-"
+            print(f"{case:<10} {metric:<20} {str(a):>14} {str(b):>14} {ratio:>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "compare":
+        parser = argparse.ArgumentParser(prog="benchmarks.run compare")
+        parser.add_argument("baseline")
+        parser.add_argument("candidate")
+        ns = parser.parse_args(argv[1:])
+        compare(ns.baseline, ns.candidate)
+        return
+
+    parser = argparse.ArgumentParser(prog="benchmarks.run", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2048, help="ancho y alto (px)")
+    parser.add_argument("--width", type=int, default=None)
+    parser.add_argument("--height", type=int, default=None)
+    parser.add_argument("--count", type=int, default=3, help="capas por llamada")
+    parser.add_argument("--dtype", default="Byte", help="Byte, UInt16, Int16 o Float32")
+    parser.add_argument("--block-size", type=int, default=256)
+    parser.add_argument("--striped", action="store_true", help="GeoTIFF por franjas (no teselado)")
+    parser.add_argument("--compress", default=None, help="p. ej. DEFLATE o LZW")
+    parser.add_argument("--nodata-fraction", type=float, default=0.05)
+    parser.add_argument("--mismatched", type=int, default=0,
+                        help="capas reproyectadas a EPSG:4326 (fuerzan alineación)")
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="archivo JSON (por defecto stdout)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+        print(f"[OK] Resultados en: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/synthetic.py
+"""
+Generador de GeoTIFFs sintéticos (sin red) para los benchmarks.
+Valores categóricos 0–7 con una fracción configurable de NoData.
+"""
+from __future__ import annotations
+from osgeo import gdal, osr
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+gdal.UseExceptions()
+
+NODATA = 255
+
+# Grilla base: UTM 14N (centro de México), píxel de 30 m
+BASE_EPSG = 32614
+BASE_ORIGIN = (500000.0, 2500000.0)
+BASE_PIXEL = 30.0
+
+# CRS al que se reproyectan las capas "desalineadas"
+MISMATCH_EPSG = 4326
+
+_DTYPES = {
+    "Byte": (gdal.GDT_Byte, np.uint8),
+    "UInt16": (gdal.GDT_UInt16, np.uint16),
+    "Int16": (gdal.GDT_Int16, np.int16),
+    "Float32": (gdal.GDT_Float32, np.float32),
+}
+
+_ROWS_PER_WRITE = 512
+
+
+def make_raster(
+    path: str,
+    width: int,
+    height: int,
+    dtype: str = "Byte",
+    tiled: bool = True,
+    block_size: int = 256,
+    epsg: int = BASE_EPSG,
+    nodata_fraction: float = 0.0,
+    compress: Optional[str] = None,
+    seed: int = 0,
+) -> str:
+    """Crea un GeoTIFF de `width`x`height` con categorías 0–7 y NoData=255."""
+    if dtype not in _DTYPES:
+        raise ValueError(f"dtype no soportado: {dtype}. Usa uno de {sorted(_DTYPES)}")
+    gdal_type, np_type = _DTYPES[dtype]
+
+    options = []
+    if tiled:
+        options += ["TILED=YES", f"BLOCKXSIZE={block_size}", f"BLOCKYSIZE={block_size}"]
+    if compress:
+        options.append(f"COMPRESS={compress}")
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    ds = gdal.GetDriverByName("GTiff").Create(path, width, height, 1, gdal_type, options=options)
+    ds.SetGeoTransform((BASE_ORIGIN[0], BASE_PIXEL, 0.0, BASE_ORIGIN[1], 0.0, -BASE_PIXEL))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(epsg)
+    ds.SetProjection(srs.ExportToWkt())
+
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(NODATA)
+
+    # se escribe por franjas para no materializar rásters grandes en memoria
+    rng = np.random.default_rng(seed)
+    for y in range(0, height, _ROWS_PER_WRITE):
+        rows = min(_ROWS_PER_WRITE, height - y)
+        block = rng.integers(0, 8, size=(rows, width)).astype(np_type)
+        if nodata_fraction > 0:
+            block[rng.random((rows, width)) < nodata_fraction] = NODATA
+        band.WriteArray(block, 0, y)
+
+    band, ds = None, None
+    return path
+
+
+def make_inputs(
+    out_dir: str,
+    count: int,
+    width: int,
+    height: int,
+    dtype: str = "Byte",
+    tiled: bool = True,
+    block_size: int = 256,
+    nodata_fraction: float = 0.0,
+    mismatched: int = 0,
+    compress: Optional[str] = None,
+    prefix: str = "layer",
+    seed: int = 0,
+) -> List[str]:
+    """
+    Genera `count` capas sobre la misma grilla; las últimas `mismatched` se
+    reproyectan a EPSG:4326 para forzar el camino de alineación.
+    """
+    out = Path(out_dir)
+    paths: List[str] = []
+    for i in range(count):
+        path = str(out / f"{prefix}_{i}.tif")
+        if i >= count - mismatched:
+            tmp = str(out / f"{prefix}_{i}_src.tif")
+            make_raster(tmp, width, height, dtype, tiled, block_size,
+                        nodata_fraction=nodata_fraction, seed=seed + i)
+            creation = ["TILED=YES"] if tiled else []
+            if compress:
+                creation.append(f"COMPRESS={compress}")
+            gdal.Warp(path, tmp, dstSRS=f"EPSG:{MISMATCH_EPSG}",
+                      resampleAlg=gdal.GRA_NearestNeighbour, dstNodata=NODATA,
+                      creationOptions=creation)
+            Path(tmp).unlink()
+        else:
+            make_raster(path, width, height, dtype, tiled, block_size,
+                        nodata_fraction=nodata_fraction, compress=compress, seed=seed + i)
+        paths.append(path)
+    return paths
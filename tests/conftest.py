@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# permite `import app...` también al correr `pytest` sin `python -m`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,60 @@
+# tests/test_output_types.py
+import pytest
+
+np = pytest.importorskip("numpy")
+gdal = pytest.importorskip("osgeo.gdal")
+
+from app.services.output_types import (  # noqa: E402
+    VALID_MAX, decode_valid, encode_block, select_output_type,
+)
+
+
+def _round_trip(values, plan):
+    """Escribe `values` como lo hace stage1 y los lee como stage2."""
+    codes = encode_block(values, np.ones(values.shape, dtype=bool), plan)
+    ds = gdal.GetDriverByName("MEM").Create("", values.shape[1], values.shape[0], 1, plan["gdal_type"])
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(plan["nodata"])
+    if plan["scale"] is not None:
+        band.SetScale(plan["scale"])
+        band.SetOffset(plan["offset"])
+    band.WriteArray(codes)
+    raw = band.ReadAsArray()
+    return decode_valid(raw, band)
+
+
+def test_stage1_max_value_survives_stage2_read():
+    # 0.5*7 + 0.7*5 = 7.0 → UInt16 con scale 8.4/65534
+    plan = select_output_type([0.5, 0.7], inputs_integer=True, tolerance=0.01, float_nodata=255.0)
+    assert plan["scale"] is not None
+
+    values = np.array([[0.0, 3.5, 7.0]], dtype=np.float32)
+    decoded, valid = _round_trip(values, plan)
+
+    assert valid.all()
+    assert decoded.max() <= VALID_MAX
+    np.testing.assert_allclose(decoded, values, atol=plan["scale"] / 2 + 1e-6)
+
+
+@pytest.mark.parametrize("total", np.round(np.arange(1.0, 10.05, 0.1), 1))
+def test_round_trip_keeps_full_valid_range(total):
+    plan = select_output_type([total / 2, total / 2], inputs_integer=False,
+                              tolerance=0.01, float_nodata=255.0)
+    values = np.linspace(0.0, VALID_MAX, 701, dtype=np.float32).reshape(1, -1)
+    _, valid = _round_trip(values, plan)
+    assert valid.all()
+
+
+def test_nodata_stays_invalid_after_round_trip():
+    plan = select_output_type([0.5, 0.7], inputs_integer=True, tolerance=0.01, float_nodata=255.0)
+    values = np.array([[1.0, 2.0]], dtype=np.float32)
+    codes = encode_block(values, np.array([[True, False]]), plan)
+    ds = gdal.GetDriverByName("MEM").Create("", 2, 1, 1, plan["gdal_type"])
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(plan["nodata"])
+    band.SetScale(plan["scale"])
+    band.SetOffset(plan["offset"])
+    band.WriteArray(codes)
+
+    _, valid = decode_valid(band.ReadAsArray(), band)
+    assert valid.tolist() == [[True, False]]